@@ -1,17 +1,25 @@
 import datetime
 import io
 import os
+import time
 import uuid
+from concurrent.futures import ThreadPoolExecutor
 
+import numpy as np
 import pandas as pd
 import pymysql
 import streamlit as st
+import xlsxwriter
+from argon2 import PasswordHasher
+from argon2.exceptions import InvalidHashError, VerificationError
+from dbutils.pooled_db import PooledDB
 from reportlab.lib import colors
 from reportlab.lib.pagesizes import A4
 from reportlab.lib.styles import getSampleStyleSheet
+from reportlab.pdfbase.pdfmetrics import stringWidth
 from reportlab.platypus import (Paragraph, SimpleDocTemplate, Spacer, Table,
                                 TableStyle)
-from werkzeug.security import check_password_hash, generate_password_hash
+from werkzeug.security import check_password_hash
 
 # ==================== CONFIG ====================
 DB_CONFIG = {
@@ -24,30 +32,62 @@ DB_CONFIG = {
 UPLOAD_DIR = "uploads"
 os.makedirs(UPLOAD_DIR, exist_ok=True)
 
+# Argon2id dengan parameter ringan: jauh lebih cepat dari PBKDF2 bawaan werkzeug
+PH = PasswordHasher(time_cost=2, memory_cost=19456, parallelism=1)
+LEGACY_HASH_PREFIXES = ("pbkdf2:", "scrypt:")
+LOGIN_MAX_FAILS = 5
+LOGIN_LOCK_SECONDS = 300
+
 
 # ==================== DB INIT ====================
+HOUSEHOLD_INDEXES = {
+    "idx_hh_name": "name",
+    "idx_hh_cls": "classification",
+}
+
+
+@st.cache_resource(show_spinner=False)
+def get_pool(database):
+    # Pool di-cache per proses (dan per database) agar tidak dibuat ulang di
+    # setiap rerun Streamlit. reset=False: dengan autocommit tidak perlu ROLLBACK
+    # tiap koneksi kembali; transaksi dari conn.begin() tetap di-rollback DBUtils
+    return PooledDB(
+        creator=pymysql,
+        mincached=2,
+        maxcached=5,
+        maxconnections=10,
+        blocking=True,
+        reset=False,
+        **{**DB_CONFIG, "database": database},
+        cursorclass=pymysql.cursors.Cursor,
+        autocommit=True,
+    )
+
+
 def get_connection(database=None):
+    if database:
+        # conn.close() mengembalikan koneksi ke pool, bukan menutupnya
+        return get_pool(database).connection()
     cfg = DB_CONFIG.copy()
     return pymysql.connect(
         host=cfg["host"],
         user=cfg["user"],
         password=cfg["password"],
-        database=database if database else None,
         port=cfg.get("port", 3306),
-        cursorclass=pymysql.cursors.DictCursor,
+        cursorclass=pymysql.cursors.Cursor,
         autocommit=True,
     )
 
 
+@st.cache_resource(show_spinner=False)
 def init_db():
+    # Semua DDL memakai satu koneksi: buat database lalu USE di handle yang sama
     conn = get_connection()
     with conn.cursor() as cur:
         cur.execute(
             f"CREATE DATABASE IF NOT EXISTS `{DB_CONFIG['database']}` CHARACTER SET utf8mb4;"
         )
-    conn.close()
-    conn = get_connection(DB_CONFIG["database"])
-    with conn.cursor() as cur:
+        cur.execute(f"USE `{DB_CONFIG['database']}`")
         cur.execute(
             """CREATE TABLE IF NOT EXISTS users(
                id INT AUTO_INCREMENT PRIMARY KEY,
@@ -65,57 +105,105 @@ def init_db():
                classification VARCHAR(50), image_path VARCHAR(255),
                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP)"""
         )
-        if not cur.execute("SELECT * FROM users WHERE username='admin'"):
+        for idx, col in HOUSEHOLD_INDEXES.items():
+            try:
+                cur.execute(f"CREATE INDEX `{idx}` ON households(`{col}`)")
+            except pymysql.err.OperationalError as e:
+                # 1061 = index sudah ada (MySQL tidak punya CREATE INDEX IF NOT EXISTS)
+                if e.args[0] != 1061:
+                    raise
+        # Hash hanya dihitung bila admin belum ada; INSERT IGNORE tetap aman
+        # terhadap proses lain yang melakukan seed bersamaan
+        if cur.execute("SELECT 1 FROM users WHERE username='admin'") == 0:
             cur.execute(
-                "INSERT INTO users(username,password_hash,role) VALUES(%s,%s,%s)",
-                ("admin", generate_password_hash("admin123"), "admin"),
+                "INSERT IGNORE INTO users(username,password_hash,role) VALUES(%s,%s,%s)",
+                ("admin", PH.hash("admin123"), "admin"),
             )
     conn.close()
 
 
 # ==================== CLASSIFY ====================
+EDU_MAP = {
+    "Tidak Sekolah": 0,
+    "SD": 10,
+    "SMP": 20,
+    "SMA/SMK": 30,
+    "Diploma": 40,
+    "S1 ke atas": 50,
+}
+OCC_MAP = {
+    "Pengangguran": 0,
+    "Buruh / Tani / Pekerja kasar": 10,
+    "Wiraswasta kecil": 20,
+    "Pegawai swasta": 30,
+    "PNS / Profesional": 40,
+}
+
+
+INCOME_BINS = [-np.inf, 2_000_000, 4_000_000, 7_000_000, np.inf]
+INCOME_SCORES = [0, 30, 60, 100]
+
+
+def classify_df(df):
+    # Skor dihitung per kolom dengan NumPy/pandas, tanpa loop per baris
+    inc = pd.to_numeric(df["monthly_income"], errors="coerce").fillna(0)
+    kids = pd.to_numeric(df["num_children"], errors="coerce").fillna(0).to_numpy()
+    inc_score = pd.cut(
+        inc, bins=INCOME_BINS, labels=INCOME_SCORES, right=False
+    ).astype(int)
+    edu_score = df["education"].map(EDU_MAP).fillna(20)
+    occ_score = df["occupation"].map(OCC_MAP).fillna(10)
+    kids_score = np.select([kids < 2, kids < 4], [10, -10], -20)
+    total = (inc_score + edu_score + occ_score).to_numpy(dtype=int) + kids_score
+    return pd.Series(
+        np.select([total < 50, total < 110], ["Miskin", "Menengah"], "Kaya"),
+        index=df.index,
+    )
+
+
 def classify_household(income, edu, kids, job):
-    score = 0
-    inc = float(income or 0)
-    if inc < 2_000_000:
-        score += 0
-    elif inc < 4_000_000:
-        score += 30
-    elif inc < 7_000_000:
-        score += 60
-    else:
-        score += 100
-    edu_map = {
-        "Tidak Sekolah": 0,
-        "SD": 10,
-        "SMP": 20,
-        "SMA/SMK": 30,
-        "Diploma": 40,
-        "S1 ke atas": 50,
-    }
-    score += edu_map.get(edu, 20)
-    kids = int(kids or 0)
-    score += 10 if kids < 2 else (-10 if kids < 4 else -20)
-    occ_map = {
-        "Pengangguran": 0,
-        "Buruh / Tani / Pekerja kasar": 10,
-        "Wiraswasta kecil": 20,
-        "Pegawai swasta": 30,
-        "PNS / Profesional": 40,
-    }
-    score += occ_map.get(job, 10)
-    return "Miskin" if score < 50 else "Menengah" if score < 110 else "Kaya"
+    row = pd.DataFrame(
+        {
+            "monthly_income": [income],
+            "education": [edu],
+            "num_children": [kids],
+            "occupation": [job],
+        }
+    )
+    return str(classify_df(row).iloc[0])
 
 
 # ==================== CRUD ====================
-def insert_household(rec):
-    sql = """INSERT INTO households
+HOUSEHOLD_COLS = [
+    "name",
+    "address",
+    "education",
+    "num_children",
+    "monthly_income",
+    "occupation",
+    "classification",
+    "image_path",
+]
+INSERT_HOUSEHOLD_SQL = """INSERT INTO households
              (name,address,education,num_children,monthly_income,occupation,classification,image_path)
              VALUES (%s,%s,%s,%s,%s,%s,%s,%s)"""
+INSERT_BATCH_ROWS = 500
+IMPORT_REJECT_SHOWN = 20
+IMPORT_DEFAULTS = {
+    "name": "",
+    "address": "",
+    "education": "SMA/SMK",
+    "num_children": 0,
+    "monthly_income": 0,
+    "occupation": "Wiraswasta kecil",
+}
+
+
+def insert_household(rec):
     conn = get_connection(DB_CONFIG["database"])
     with conn.cursor() as cur:
         cur.execute(
-            sql,
+            INSERT_HOUSEHOLD_SQL,
             (
                 rec["name"],
                 rec["address"],
@@ -127,50 +215,282 @@ def insert_household(rec):
                 rec.get("image_path"),
             ),
         )
+        hh_id = cur.lastrowid
+    conn.close()
+    invalidate_households()
+    return hh_id
+
+
+def prepare_import(df):
+    # Isi default & klasifikasi seluruh baris Excel dalam satu langkah
+    out = pd.DataFrame(index=df.index)
+    for col, default in IMPORT_DEFAULTS.items():
+        out[col] = df[col].fillna(default) if col in df else default
+    # Sel kosong memakai default, tetapi sel berisi teks non-angka
+    # (mis. "lima juta") ditolak agar tidak tersimpan sebagai 0
+    invalid = pd.Series(False, index=df.index)
+    for col in ("num_children", "monthly_income"):
+        num = pd.to_numeric(out[col], errors="coerce")
+        # NaN (teks) maupun inf ("inf", "1e400") ditolak
+        invalid |= ~np.isfinite(num)
+        out[col] = num
+    out = out[~invalid].copy()
+    out["num_children"] = out["num_children"].astype(int)
+    out["monthly_income"] = out["monthly_income"].astype(float)
+    out["classification"] = classify_df(out)
+    out["image_path"] = None
+    # Nomor baris Excel (baris 1 = header)
+    rejected = (np.flatnonzero(invalid.to_numpy()) + 2).tolist()
+    return out[HOUSEHOLD_COLS], rejected
+
+
+def insert_households(df):
+    # astype(object) agar pymysql menerima int/float Python, bukan skalar NumPy
+    rows = list(df.astype(object).itertuples(index=False, name=None))
+    if not rows:
+        return 0
+    head = "INSERT INTO households({}) VALUES ".format(",".join(HOUSEHOLD_COLS))
+    placeholder = "(" + ",".join(["%s"] * len(HOUSEHOLD_COLS)) + ")"
+    conn = get_connection(DB_CONFIG["database"])
+    try:
+        # Semua batch dalam satu transaksi: import tersimpan seluruhnya atau tidak
+        # sama sekali
+        conn.begin()
+        with conn.cursor() as cur:
+            # Satu statement multi-VALUES per batch; 500 baris jauh di bawah
+            # max_allowed_packet bawaan MySQL
+            for i in range(0, len(rows), INSERT_BATCH_ROWS):
+                batch = rows[i : i + INSERT_BATCH_ROWS]
+                cur.execute(
+                    head + ",".join([placeholder] * len(batch)),
+                    [v for row in batch for v in row],
+                )
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        conn.close()
+    invalidate_households()
+    return len(rows)
+
+
+HOUSEHOLD_SELECT = (
+    "SELECT id,name,address,education,num_children,monthly_income,"
+    "occupation,classification,image_path,created_at FROM households"
+)
+
+
+def cursor_to_df(cur):
+    # Baris tuple + nama kolom dari cursor.description: tanpa dict per baris
+    return pd.DataFrame.from_records(
+        cur.fetchall(), columns=[d[0] for d in cur.description]
+    )
+
+
+@st.cache_data(ttl=300, show_spinner=False)
+def fetch_all(version: int):
+    # `version` hanya kunci cache; dinaikkan setiap ada penulisan data
+    conn = get_connection(DB_CONFIG["database"])
+    with conn.cursor() as cur:
+        cur.execute(HOUSEHOLD_SELECT + " ORDER BY created_at DESC")
+        df = cursor_to_df(cur)
+    conn.close()
+    return df
+
+
+def like_pattern(q: str):
+    # Escape wildcard LIKE agar input dicocokkan apa adanya
+    q = q.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+    return f"%{q}%"
+
+
+@st.cache_data(ttl=300, show_spinner=False)
+def fetch_summary(version: int, q: str = ""):
+    # (total, miskin, menengah, kaya) dalam satu baris hasil; `q` menyaring nama
+    sql = (
+        "SELECT COUNT(*),"
+        " COALESCE(SUM(classification='Miskin'),0),"
+        " COALESCE(SUM(classification='Menengah'),0),"
+        " COALESCE(SUM(classification='Kaya'),0) FROM households"
+    )
+    args = ()
+    if q:
+        sql += " WHERE name LIKE %s"
+        args = (like_pattern(q),)
+    conn = get_connection(DB_CONFIG["database"])
+    with conn.cursor() as cur:
+        cur.execute(sql, args)
+        row = cur.fetchone()
+    conn.close()
+    return tuple(int(v) for v in row)
+
+
+@st.cache_data(ttl=300, show_spinner=False)
+def search_households(q: str, version: int, limit: int = 500):
+    conn = get_connection(DB_CONFIG["database"])
+    with conn.cursor() as cur:
+        cur.execute(
+            HOUSEHOLD_SELECT + " WHERE name LIKE %s ORDER BY created_at DESC LIMIT %s",
+            (like_pattern(q), limit),
+        )
+        df = cursor_to_df(cur)
     conn.close()
+    return df
 
 
-def fetch_all():
+@st.cache_data(ttl=300, show_spinner=False)
+def fetch_names(version: int):
+    # Pasangan (id, name); idx_hh_name memuat id sehingga cukup index-only scan
     conn = get_connection(DB_CONFIG["database"])
     with conn.cursor() as cur:
-        cur.execute("SELECT * FROM households ORDER BY created_at DESC")
+        cur.execute("SELECT id, name FROM households ORDER BY name, id")
         rows = cur.fetchall()
     conn.close()
-    return rows
+    return [tuple(r) for r in rows]
+
+
+def households_version():
+    return st.session_state.get("_hh_ver", 0)
 
 
-def delete_household_by_name(nama: str):
+def invalidate_households():
+    st.session_state["_hh_ver"] = households_version() + 1
+    fetch_all.clear()
+    fetch_summary.clear()
+    search_households.clear()
+    fetch_names.clear()
+
+
+def clear_household_image(hh_id: int):
     conn = get_connection(DB_CONFIG["database"])
     with conn.cursor() as cur:
-        cur.execute("DELETE FROM households WHERE name=%s", (nama,))
+        cur.execute("UPDATE households SET image_path=NULL WHERE id=%s", (hh_id,))
     conn.close()
+    invalidate_households()
 
 
-def verify_user(u, p):
+def delete_household(hh_id: int):
     conn = get_connection(DB_CONFIG["database"])
     with conn.cursor() as cur:
+        cur.execute("DELETE FROM households WHERE id=%s", (hh_id,))
+    conn.close()
+    invalidate_households()
+
+
+@st.cache_resource(show_spinner=False)
+def login_failures():
+    # username -> daftar waktu login gagal, dibagi antar sesi dalam satu proses
+    return {}
+
+
+def login_locked(u):
+    # Sapu entri kedaluwarsa di seluruh dict agar ukurannya tetap terbatas
+    now = time.monotonic()
+    failures = login_failures()
+    for name, times in list(failures.items()):
+        fails = [t for t in times if now - t < LOGIN_LOCK_SECONDS]
+        if fails:
+            failures[name] = fails
+        else:
+            del failures[name]
+    return len(failures.get(u, [])) >= LOGIN_MAX_FAILS
+
+
+def check_password(stored, p):
+    if stored.startswith(LEGACY_HASH_PREFIXES):
+        return check_password_hash(stored, p)
+    try:
+        return PH.verify(stored, p)
+    except (VerificationError, InvalidHashError):
+        return False
+
+
+def verify_user(u, p):
+    conn = get_connection(DB_CONFIG["database"])
+    with conn.cursor(pymysql.cursors.DictCursor) as cur:
         cur.execute("SELECT * FROM users WHERE username=%s", (u,))
         row = cur.fetchone()
+        ok = bool(row) and check_password(row["password_hash"], p)
+        if ok and (
+            row["password_hash"].startswith(LEGACY_HASH_PREFIXES)
+            or PH.check_needs_rehash(row["password_hash"])
+        ):
+            # Hash lama (werkzeug) diganti argon2 saat login berhasil
+            cur.execute(
+                "UPDATE users SET password_hash=%s WHERE id=%s",
+                (PH.hash(p), row["id"]),
+            )
     conn.close()
-    return (
-        row and check_password_hash(row["password_hash"], p),
-        row["role"] if row else None,
-    )
+    if ok:
+        login_failures().pop(u, None)
+    else:
+        # Username yang tidak ada juga dicatat agar lockout tidak membocorkan
+        # keberadaan akun
+        login_failures().setdefault(u, []).append(time.monotonic())
+    return ok, row["role"] if row else None
+
+
+# ==================== UPLOAD ====================
+@st.cache_resource(show_spinner=False)
+def get_executor():
+    return ThreadPoolExecutor(max_workers=2)
+
+
+def save_upload(data, path):
+    with open(path, "wb") as f:
+        f.write(data)
 
 
 # ==================== EXPORT ====================
+PDF_STYLES = getSampleStyleSheet()
+PDF_TITLE_STYLE = PDF_STYLES["Title"]
+PDF_CELL_MAX = 80
+PDF_CHUNK_ROWS = 50
+# Font & padding bawaan sel Table ReportLab, dipakai untuk menghitung lebar kolom
+PDF_CELL_FONT = ("Helvetica", 10)
+PDF_CELL_PADDING = 12
+PDF_TABLE_STYLE = TableStyle(
+    [
+        ("BACKGROUND", (0, 0), (-1, 0), colors.grey),
+        ("TEXTCOLOR", (0, 0), (-1, 0), colors.whitesmoke),
+        ("INNERGRID", (0, 0), (-1, -1), 0.25, colors.black),
+        ("BOX", (0, 0), (-1, -1), 0.25, colors.black),
+    ]
+)
+
+
+@st.cache_data(ttl=300, show_spinner=False)
 def df_to_excel_bytes(df):
+    # df.to_excel menulis per kolom sehingga tidak cocok dengan constant_memory;
+    # di sini baris ditulis berurutan langsung lewat xlsxwriter
+    out = df.copy()
+    for c in out.select_dtypes(include="object"):
+        out[c] = out[c].where(out[c].isna(), out[c].astype(str).str.strip())
+    out = out.astype(object).where(out.notna(), None)
+
     buf = io.BytesIO()
-    with pd.ExcelWriter(buf, engine="xlsxwriter") as w:
-        df.to_excel(w, index=False, sheet_name="households")
+    wb = xlsxwriter.Workbook(
+        buf,
+        {
+            "constant_memory": True,
+            "strings_to_urls": False,
+            "default_date_format": "yyyy-mm-dd hh:mm:ss",
+        },
+    )
+    ws = wb.add_worksheet("households")
+    ws.write_row(0, 0, [str(c) for c in out.columns])
+    for r, row in enumerate(out.itertuples(index=False, name=None), start=1):
+        ws.write_row(r, 0, row)
+    wb.close()
     return buf.getvalue()
 
 
+@st.cache_data(ttl=300, show_spinner=False)
 def df_to_pdf_bytes(df):
     buf = io.BytesIO()
     doc = SimpleDocTemplate(buf, pagesize=A4)
-    styles = getSampleStyleSheet()
-    elems = [Paragraph("Laporan Data Kemiskinan", styles["Title"]), Spacer(1, 12)]
+    elems = [Paragraph("Laporan Data Kemiskinan", PDF_TITLE_STYLE), Spacer(1, 12)]
     cols = [
         "id",
         "name",
@@ -181,30 +501,36 @@ def df_to_pdf_bytes(df):
         "classification",
         "created_at",
     ]
-    data = [cols] + [[str(r[c]) for c in cols] for _, r in df[cols].iterrows()]
-    t = Table(data, repeatRows=1)
-    t.setStyle(
-        TableStyle(
-            [
-                ("BACKGROUND", (0, 0), (-1, 0), colors.grey),
-                ("TEXTCOLOR", (0, 0), (-1, 0), colors.whitesmoke),
-                ("INNERGRID", (0, 0), (-1, -1), 0.25, colors.black),
-                ("BOX", (0, 0), (-1, -1), 0.25, colors.black),
-            ]
+    # Konversi sekaligus per kolom; teks panjang dipotong agar layout tabel tetap ringan
+    sub = df[cols].astype(str).apply(lambda s: s.str.slice(0, PDF_CELL_MAX))
+    body = sub.to_numpy().tolist()
+    # Lebar kolom dihitung sekali dari seluruh data agar semua potongan sejajar
+    col_widths = [
+        max(
+            stringWidth(v, *PDF_CELL_FONT)
+            for v in [c, *sub[c].drop_duplicates()]
         )
-    )
-    elems.append(t)
+        + PDF_CELL_PADDING
+        for c in cols
+    ]
+    # Satu Table per potongan baris: layout ReportLab tidak lagi membengkak
+    # untuk ribuan baris sekaligus
+    for i in range(0, len(body), PDF_CHUNK_ROWS):
+        elems.append(
+            Table(
+                [cols] + body[i : i + PDF_CHUNK_ROWS],
+                colWidths=col_widths,
+                repeatRows=1,
+                style=PDF_TABLE_STYLE,
+            )
+        )
+        elems.append(Spacer(1, 6))
     doc.build(elems)
     return buf.getvalue()
 
 
-# ==================== UI ====================
-st.set_page_config(page_title="Aplikasi Data Masyarakat", layout="wide")
-init_db()
-
-# ----- Custom CSS -----
-st.markdown(
-    """
+# ==================== STYLE ====================
+CSS = """
 <style>
 /* ====== Full Background Image ====== */
     .stApp {
@@ -222,21 +548,6 @@ st.markdown(
     [data-testid="stAppViewContainer"] > .main {
         background: rgba(255,255,255,0.0);
     }
-.export-card {
-    max-width: 600px;
-    margin: 30px auto;
-    background: #ffffffcc;
-    padding: 25px;
-    border-radius: 12px;
-    box-shadow: 0 8px 20px rgba(0,0,0,0.25);
-    text-align: center;
-}
-.export-title {
-    font-size: 1.4rem;
-    font-weight: bold;
-    margin-bottom: 15px;
-    color: #ffffff;
-}
 body {
     background: linear-gradient(135deg, #74ABE2 25%, #5563DE 100%);
     background-attachment: fixed;
@@ -299,9 +610,15 @@ body {
     color:#0f172a;
 }
 </style>
-""",
-    unsafe_allow_html=True,
-)
+"""
+
+
+# ==================== UI ====================
+st.set_page_config(page_title="Aplikasi Data Masyarakat", layout="wide")
+init_db()
+
+# ----- Custom CSS -----
+st.markdown(CSS, unsafe_allow_html=True)
 
 # Header
 st.markdown(
@@ -320,15 +637,18 @@ if not st.session_state.logged_in:
         u = st.text_input("Username")
         p = st.text_input("Password", type="password")
         if st.form_submit_button("Masuk"):
-            ok, role = verify_user(u.strip(), p.strip())
-            if ok:
-                st.session_state.update(
-                    {"logged_in": True, "username": u, "role": role}
-                )
-                st.success("Login berhasil.")
-                st.rerun()
+            if login_locked(u.strip()):
+                st.error("Terlalu banyak percobaan login. Coba lagi nanti.")
             else:
-                st.error("Login gagal — cek username/password.")
+                ok, role = verify_user(u.strip(), p.strip())
+                if ok:
+                    st.session_state.update(
+                        {"logged_in": True, "username": u, "role": role}
+                    )
+                    st.success("Login berhasil.")
+                    st.rerun()
+                else:
+                    st.error("Login gagal — cek username/password.")
     st.markdown(
         '<div class="footer">&copy; 2025 - All Reserved</div>', unsafe_allow_html=True
     )
@@ -364,32 +684,48 @@ if menu == "Logout":
     st.rerun()
 
 elif menu == "Dashboard":
-    rows = fetch_all()
-    if not rows:
+    summary = fetch_summary(households_version())
+    if not summary[0]:
         st.info("Belum ada data.")
     else:
-        df = pd.DataFrame(rows)
         search = st.text_input("Cari nama:")
+        df = None
         if search:
-            df = df[df["name"].str.contains(search, case=False, na=False)]
+            # Metrik dihitung di server tanpa LIMIT; LIMIT hanya untuk tabel
+            summary = fetch_summary(households_version(), search)
+            df = search_households(search, households_version())
 
+        total, miskin, menengah, kaya = summary
         c1, c2, c3, c4 = st.columns(4)
-        c1.metric("Total", len(df))
-        c2.metric("Miskin", (df["classification"] == "Miskin").sum())
-        c3.metric("Menengah", (df["classification"] == "Menengah").sum())
-        c4.metric("Kaya", (df["classification"] == "Kaya").sum())
-
-        st.markdown('<div class="table-container">', unsafe_allow_html=True)
-        st.dataframe(df, height=250, use_container_width=True)
-        st.markdown("</div>", unsafe_allow_html=True)
+        c1.metric("Total", total)
+        c2.metric("Miskin", miskin)
+        c3.metric("Menengah", menengah)
+        c4.metric("Kaya", kaya)
+
+        # Tabel penuh hanya dimuat bila diminta atau saat mencari
+        # Toggle selalu dirender agar statusnya tidak hilang saat mencari
+        show_table = st.toggle("Tampilkan tabel data")
+        if search or show_table:
+            if df is None:
+                df = fetch_all(households_version())
+            st.markdown('<div class="table-container">', unsafe_allow_html=True)
+            st.dataframe(df, height=250, use_container_width=True)
+            st.markdown("</div>", unsafe_allow_html=True)
 
         st.subheader("Hapus Data Berdasarkan Nama")
-        if not df.empty:
-            del_name = st.selectbox(
-                "Pilih Nama untuk dihapus", df["name"].unique().tolist()
+        options = (
+            list(zip(df["id"].tolist(), df["name"].tolist()))
+            if search
+            else fetch_names(households_version())
+        )
+        if options:
+            del_id, del_name = st.selectbox(
+                "Pilih Nama untuk dihapus",
+                options,
+                format_func=lambda o: f"{o[1]} (ID {o[0]})",
             )
             if st.button("Hapus"):
-                delete_household_by_name(del_name)
+                delete_household(del_id)
                 st.success(f"Data dengan nama '{del_name}' berhasil dihapus.")
                 st.rerun()
 
@@ -415,27 +751,48 @@ elif menu == "Tambah Data":
         )
         foto = st.file_uploader("Upload Foto (opsional)", type=["png", "jpg", "jpeg"])
         if st.form_submit_button("Simpan"):
-            path = None
+            path, fut = None, None
             if foto:
                 ext = os.path.splitext(foto.name)[1]
                 fname = f"{uuid.uuid4().hex}{ext}"
                 path = os.path.join(UPLOAD_DIR, fname)
-                with open(path, "wb") as f:
-                    f.write(foto.getbuffer())
+                # Path sudah pasti, jadi tulis file berjalan paralel dengan insert DB
+                fut = get_executor().submit(save_upload, foto.getvalue(), path)
             cls = classify_household(inc, edu, kids, job)
-            insert_household(
-                {
-                    "name": name,
-                    "address": addr,
-                    "education": edu,
-                    "num_children": int(kids),
-                    "monthly_income": float(inc),
-                    "occupation": job,
-                    "classification": cls,
-                    "image_path": path,
-                }
-            )
-            st.success(f"Data tersimpan. Klasifikasi: **{cls}**")
+            try:
+                hh_id = insert_household(
+                    {
+                        "name": name,
+                        "address": addr,
+                        "education": edu,
+                        "num_children": int(kids),
+                        "monthly_income": float(inc),
+                        "occupation": job,
+                        "classification": cls,
+                        "image_path": path,
+                    }
+                )
+            except Exception as e:
+                # Baris gagal disimpan: jangan tinggalkan foto tanpa data
+                if fut:
+                    fut.exception()
+                    if os.path.exists(path):
+                        os.remove(path)
+                st.error(f"Gagal menyimpan data: {e}")
+            else:
+                try:
+                    if fut:
+                        fut.result()
+                except OSError as e:
+                    # Foto gagal ditulis: data tetap tersimpan tanpa image_path
+                    clear_household_image(hh_id)
+                    if os.path.exists(path):
+                        os.remove(path)
+                    st.error(
+                        f"Data tersimpan tanpa foto, gagal menyimpan foto: {e}"
+                    )
+                else:
+                    st.success(f"Data tersimpan. Klasifikasi: **{cls}**")
 
 elif menu == "Import Excel":
     # ===== Card Wrapper =====
@@ -464,42 +821,33 @@ elif menu == "Import Excel":
                 df = pd.read_excel(file_xlsx)
                 st.markdown("**Preview Data (5 baris pertama):**")
                 st.dataframe(df.head(), use_container_width=True)
-
-                inserted = 0
-                for _, r in df.iterrows():
-                    try:
-                        insert_household(
-                            {
-                                "name": r.get("name", ""),
-                                "address": r.get("address", ""),
-                                "education": r.get("education", "SMA/SMK"),
-                                "num_children": int(r.get("num_children", 0) or 0),
-                                "monthly_income": float(
-                                    r.get("monthly_income", 0) or 0
-                                ),
-                                "occupation": r.get("occupation", "Wiraswasta kecil"),
-                                "classification": classify_household(
-                                    r.get("monthly_income", 0),
-                                    r.get("education", "SMA/SMK"),
-                                    r.get("num_children", 0),
-                                    r.get("occupation", "Wiraswasta kecil"),
-                                ),
-                                "image_path": None,
-                            }
-                        )
-                        inserted += 1
-                    except Exception as e_row:
-                        st.warning(f"Gagal import baris: {e_row}")
-
-                st.success(f"Import selesai. {inserted} baris berhasil disimpan.")
             except Exception as e:
                 st.error(f"Gagal membaca file Excel: {e}")
+            else:
+                try:
+                    valid, rejected = prepare_import(df)
+                    if rejected:
+                        shown = ", ".join(map(str, rejected[:IMPORT_REJECT_SHOWN]))
+                        more = len(rejected) - IMPORT_REJECT_SHOWN
+                        st.warning(
+                            f"{len(rejected)} baris dilewati karena num_children/"
+                            f"monthly_income bukan angka: baris {shown}"
+                            + (f" dan {more} lainnya." if more > 0 else ".")
+                        )
+                    inserted = insert_households(valid)
+                    st.success(
+                        f"Import selesai. {inserted} baris berhasil disimpan."
+                    )
+                except Exception as e_imp:
+                    st.error(
+                        f"Gagal import data, tidak ada baris disimpan: {e_imp}"
+                    )
 
     # ===== Penutup div card =====
     st.markdown("</div>", unsafe_allow_html=True)
 
 elif menu == "Export Excel":
-    df = pd.DataFrame(fetch_all())
+    df = fetch_all(households_version())
     if df.empty:
         st.info("Belum ada data.")
     else:
@@ -533,7 +881,7 @@ elif menu == "Export Excel":
             )
 
 elif menu == "Export PDF":
-    df = pd.DataFrame(fetch_all())
+    df = fetch_all(households_version())
     if df.empty:
         st.info("Belum ada data.")
     else:
@@ -578,9 +926,9 @@ elif menu == "Kelola Users":
         conn = get_connection(DB_CONFIG["database"])
         with conn.cursor() as cur:
             cur.execute("SELECT id,username,role,created_at FROM users")
-            users = cur.fetchall()
+            users = cursor_to_df(cur)
         conn.close()
-        st.dataframe(pd.DataFrame(users))
+        st.dataframe(users)
         with st.form("add_user"):
             u = st.text_input("Username baru")
             p = st.text_input("Password", type="password")
@@ -591,7 +939,7 @@ elif menu == "Kelola Users":
                     with conn.cursor() as cur:
                         cur.execute(
                             "INSERT INTO users(username,password_hash,role) VALUES(%s,%s,%s)",
-                            (u, generate_password_hash(p), r),
+                            (u, PH.hash(p), r),
                         )
                     conn.close()
                     st.success("User dibuat.")